@@ -0,0 +1,297 @@
+"""Agregados precalculados del dashboard, compartidos por app.py y la API JSON.
+
+`construir_agregados` resume la base por fila una sola vez por versión de los
+datos en tablas pequeñas de conteos y sumas. Las funciones de consulta filtran
+y reagrupan esas tablas con los mismos filtros que ofrecen los widgets, sin
+volver a tocar la base por fila.
+"""
+
+import numpy as np
+import pandas as pd
+
+from cache_resultados import RUTA_BASE, cache_persistente
+
+ANIOS = [2023, 2024, 2025]
+
+# Diccionario: código → nombre oficial de región
+diccionario_regiones = {
+    "01": "Tarapacá",
+    "02": "Antofagasta",
+    "03": "Atacama",
+    "04": "Coquimbo",
+    "05": "Valparaíso",
+    "06": "O'Higgins",
+    "07": "Maule",
+    "08": "Biobío",
+    "09": "La Araucanía",
+    "10": "Los Lagos",
+    "11": "Aysén",
+    "12": "Magallanes",
+    "13": "Metropolitana",
+    "14": "Los Ríos",
+    "15": "Arica y Parinacota",
+    "16": "Ñuble",
+    "17": "Los Andes"
+}
+
+
+# ---------------------------
+# Base por fila
+# ---------------------------
+
+def limpiar_base(base):
+    base["ANIO"] = pd.to_numeric(base["ANIO"], errors="coerce").fillna(0).astype(int)
+    base = base[base["ANIO"].isin(ANIOS)].copy()
+    base["CODIGO_REGION"] = pd.to_numeric(base["CODIGO_REGION"], errors="coerce").astype("Int64")
+    return base
+
+
+@cache_persistente
+def cargar_base():
+    return limpiar_base(pd.read_excel(RUTA_BASE))
+
+
+# ---------------------------
+# Agregados
+# ---------------------------
+
+@cache_persistente
+def construir_agregados(base):
+    """Tablas de conteos y sumas de las que se derivan todas las consultas.
+
+    Se agrupa con ``dropna=False`` para que los totales coincidan con los que
+    se calculan sobre la base por fila.
+    """
+    carrera_sexo = base.groupby(["ANIO", "CARRERA", "SEXO"], dropna=False).agg(
+        N=("ANIO", "size"),
+        SUMA_PTJE=("PTJE_PONDERADO", "sum"),
+        N_PTJE=("PTJE_PONDERADO", "count"),
+    ).reset_index()
+
+    regiones = (
+        base.assign(CODIGO_REGION=base["CODIGO_REGION"].astype(str).str.zfill(2))
+        .groupby(["ANIO", "CODIGO_REGION"]).size().reset_index(name="N")
+    )
+
+    dependencia = base.groupby(
+        ["ANIO", "CARRERA", "GRUPO_DEPENDENCIA_EST"], dropna=False
+    ).size().reset_index(name="N")
+
+    ingreso = base.groupby(["ANIO", "INGRESO", "CARRERA"], dropna=False).size().reset_index(name="N")
+
+    region_carrera = base.groupby(["ANIO", "CODIGO_REGION", "CARRERA"]).size().reset_index(name="N")
+
+    return {
+        "carrera_sexo": carrera_sexo,
+        "regiones": regiones,
+        "dependencia": dependencia,
+        "ingreso": ingreso,
+        "region_carrera": region_carrera,
+    }
+
+
+def _filtrar(df, **filtros):
+    # None = sin filtro en esa columna
+    for columna, valores in filtros.items():
+        if valores is not None:
+            df = df[df[columna].isin(valores)]
+    return df
+
+
+# ---------------------------
+# Consultas
+# ---------------------------
+
+def carreras(agregados):
+    return sorted(agregados["carrera_sexo"]["CARRERA"].dropna().unique())
+
+
+def tendencia_puntaje(agregados, carreras=None, por_sexo=False):
+    """Puntaje ponderado promedio por año y carrera (y sexo si `por_sexo`)."""
+    df = _filtrar(agregados["carrera_sexo"], CARRERA=carreras)
+    claves = ["ANIO", "CARRERA"]
+    if por_sexo:
+        df = df[df["SEXO"].notna()]
+        claves.append("SEXO")
+    df = df.groupby(claves)[["SUMA_PTJE", "N_PTJE"]].sum().reset_index()
+    if por_sexo:
+        df = df[df["N_PTJE"] > 0]
+    df["PTJE_PONDERADO"] = df["SUMA_PTJE"] / df["N_PTJE"]
+    return df[claves + ["PTJE_PONDERADO", "N_PTJE"]].reset_index(drop=True)
+
+
+def proporcion_sexo(agregados, carreras=None):
+    """Cantidad y proporción de postulantes por sexo, año y carrera."""
+    df = _filtrar(agregados["carrera_sexo"], CARRERA=carreras)
+    df_n = df[df["SEXO"].notna()].groupby(["ANIO", "SEXO", "CARRERA"])["N"].sum().reset_index()
+    df_n["TOTAL"] = df_n.groupby(["ANIO", "CARRERA"])["N"].transform("sum")
+    df_n["PROPORCION"] = df_n["N"] / df_n["TOTAL"]
+    df_n["TEXTO"] = (df_n["PROPORCION"] * 100).round(1).astype(str) + "%"
+
+    df_n["SEXO"] = pd.Categorical(df_n["SEXO"], categories=["MASCULINO", "FEMENINO"], ordered=True)
+    return df_n.sort_values(["ANIO", "CARRERA", "SEXO"]).reset_index(drop=True)
+
+
+def conteo_regiones(agregados, anio=2025):
+    """Estudiantes por región en un año."""
+    df = _filtrar(agregados["regiones"], ANIO=[anio])
+    region_count = df.groupby("CODIGO_REGION")["N"].sum().reset_index(name="N_ESTUDIANTES")
+    region_count["NOMBRE_REGION"] = region_count["CODIGO_REGION"].map(diccionario_regiones).fillna(region_count["CODIGO_REGION"])
+    return region_count
+
+
+def conteo_dependencia(agregados, carreras=None, anios=None):
+    """Estudiantes por año y grupo de dependencia del establecimiento."""
+    df = _filtrar(agregados["dependencia"], CARRERA=carreras, ANIO=anios)
+    return df.groupby(["ANIO", "GRUPO_DEPENDENCIA_EST"])["N"].sum().reset_index(name="N_ESTUDIANTES")
+
+
+def conteo_ingreso(agregados, anio=2025, ingreso=None):
+    """Estudiantes por tipo de ingreso, o por carrera dentro de un tipo de ingreso."""
+    df = _filtrar(agregados["ingreso"], ANIO=[anio])
+    if ingreso is None:
+        ingreso_counts = df.groupby("INGRESO")["N"].sum().reset_index(name="CANTIDAD")
+        ingreso_counts["PORCENTAJE"] = ingreso_counts["CANTIDAD"] / ingreso_counts["CANTIDAD"].sum()
+        return ingreso_counts
+    df = df[(df["INGRESO"] == ingreso) & df["CARRERA"].notna()]
+    return df.groupby(["INGRESO", "CARRERA"])["N"].sum().reset_index(name="CANTIDAD")
+
+
+# ---------------------------
+# Índice de puntajes por carrera, año y sexo
+# ---------------------------
+# Cada grupo guarda sus puntajes ordenados: los cuantiles se leen por posición
+# y el percentil de un puntaje se obtiene con búsqueda binaria. Además de los
+# grupos (carrera, año, sexo) se guardan ya combinados todos los años y/o ambos
+# sexos de cada carrera (None en la clave), que son las consultas de la app.
+
+NIVELES_INDICE = [["ANIO", "SEXO"], ["SEXO"], ["ANIO"], []]
+
+
+@cache_persistente
+def construir_indice_puntajes(base):
+    df = base[
+        base["CARRERA"].notna() &
+        base["SEXO"].notna() &
+        base["PTJE_PONDERADO"].notna()
+    ]
+    indice = {}
+    for nivel in NIVELES_INDICE:
+        for valores, grupo in df.groupby(["CARRERA"] + nivel):
+            valores = dict(zip(["CARRERA"] + nivel, valores))
+            anio = int(valores["ANIO"]) if "ANIO" in valores else None
+            clave = (valores["CARRERA"], anio, valores.get("SEXO"))
+            indice[clave] = np.sort(grupo["PTJE_PONDERADO"].to_numpy(dtype=float))
+    return indice
+
+
+def puntajes_indice(indice, carrera, anio=None, sexo=None):
+    """Puntajes ordenados de un grupo; None = todos los años / ambos sexos."""
+    return indice.get((carrera, anio, sexo), np.array([], dtype=float))
+
+
+def cuantil_puntaje(puntajes, q):
+    # Interpolación lineal, igual que pandas .quantile()
+    if len(puntajes) == 0:
+        return np.nan
+    posicion = q * (len(puntajes) - 1)
+    inferior = int(np.floor(posicion))
+    superior = min(inferior + 1, len(puntajes) - 1)
+    return puntajes[inferior] + (puntajes[superior] - puntajes[inferior]) * (posicion - inferior)
+
+
+def percentil_puntaje(puntajes, valor):
+    # Porcentaje de postulantes con puntaje menor o igual a `valor`
+    if len(puntajes) == 0:
+        return np.nan
+    return 100 * np.searchsorted(puntajes, valor, side="right") / len(puntajes)
+
+
+# ---------------------------
+# Matriz región × carrera
+# ---------------------------
+
+def matriz_region_carrera(agregados, anio=2025):
+    """Estudiantes por región (filas) y carrera (columnas), en formato disperso."""
+    df = _filtrar(agregados["region_carrera"], ANIO=[anio])
+    matriz = df.pivot_table(index="CODIGO_REGION", columns="CARRERA", values="N", aggfunc="sum", fill_value=0)
+    matriz.index = matriz.index.astype(int)
+    matriz.columns.name = "CARRERA"
+    return matriz.astype(pd.SparseDtype("int64", 0))
+
+
+def top_carreras_region(matriz, region, k=10):
+    """Las `k` carreras con más estudiantes en una región (una fila de la matriz).
+
+    Con ``k=None`` devuelve todas las carreras con estudiantes en la región.
+    """
+    if region not in matriz.index:
+        return pd.DataFrame({"CARRERA": pd.Series(dtype=str), "N_ESTUDIANTES": pd.Series(dtype="int64")})
+    fila = matriz.loc[region].sparse.to_dense()
+    fila = fila[fila > 0].sort_values(ascending=False, kind="stable")
+    if k is not None:
+        fila = fila.head(k)
+    return fila.rename_axis("CARRERA").reset_index(name="N_ESTUDIANTES")
+
+
+def recortar_top_k(matriz, k):
+    """Deja solo las carreras que están entre las `k` primeras de alguna región."""
+    columnas = set()
+    for region in matriz.index:
+        columnas.update(top_carreras_region(matriz, region, k)["CARRERA"])
+    return matriz[[c for c in matriz.columns if c in columnas]]
+
+
+def normalizar_matriz(matriz, eje=None):
+    """Matriz densa con conteos (`eje=None`) o proporciones por "fila" o "columna".
+
+    Normalizar antes de recortar columnas: la proporción es sobre el total de
+    la región (o carrera), incluidas las columnas que no se muestran.
+
+    >>> m = pd.DataFrame({"A": [3, 0], "B": [1, 2]}, index=[8, 13]).astype(pd.SparseDtype("int64", 0))
+    >>> float(normalizar_matriz(m, "fila").loc[8, "A"])
+    0.75
+    >>> float(normalizar_matriz(m, "columna").loc[13, "B"])
+    0.6666666666666666
+    """
+    densa = matriz.sparse.to_dense().astype(float)
+    if eje == "fila":
+        return densa.div(densa.sum(axis=1).replace(0, np.nan), axis=0).fillna(0)
+    if eje == "columna":
+        return densa.div(densa.sum(axis=0).replace(0, np.nan), axis=1).fillna(0)
+    return densa
+
+
+def _orden_jerarquico(valores):
+    # Orden de las hojas de un clustering aglomerativo (enlace promedio, distancia coseno)
+    n = len(valores)
+    if n < 3:
+        return list(range(n))
+    normas = np.linalg.norm(valores, axis=1)
+    normas[normas == 0] = 1
+    unitarios = valores / normas[:, None]
+    distancias = 1 - unitarios @ unitarios.T
+    np.fill_diagonal(distancias, np.inf)
+
+    grupos = {i: [i] for i in range(n)}
+    activos = list(range(n))
+    while len(activos) > 1:
+        sub = distancias[np.ix_(activos, activos)]
+        i, j = np.unravel_index(np.argmin(sub), sub.shape)
+        a, b = activos[i], activos[j]
+        tam_a, tam_b = len(grupos[a]), len(grupos[b])
+        # Lance-Williams para enlace promedio: el grupo fusionado queda en `a`
+        distancias[a, :] = (tam_a * distancias[a, :] + tam_b * distancias[b, :]) / (tam_a + tam_b)
+        distancias[:, a] = distancias[a, :]
+        distancias[a, a] = np.inf
+        grupos[a] = grupos[a] + grupos.pop(b)
+        activos.remove(b)
+    return grupos[activos[0]]
+
+
+def ordenar_por_clustering(matriz):
+    """Reordena filas y columnas para que las regiones y carreras parecidas queden juntas."""
+    valores = matriz.to_numpy(dtype=float)
+    filas = _orden_jerarquico(valores)
+    columnas = _orden_jerarquico(valores.T)
+    return matriz.iloc[filas, columnas]
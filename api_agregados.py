@@ -0,0 +1,194 @@
+"""API JSON local con los mismos agregados que muestran las pestañas del dashboard.
+
+Se ejecuta junto a la app de Streamlit, en otro proceso:
+
+    python api_agregados.py --puerto 8502
+
+Rutas (los parámetros replican los filtros de los widgets; ``carrera`` se
+puede repetir):
+
+- ``/api/version``: versión de los datos.
+- ``/api/carreras``: carreras disponibles.
+- ``/api/tendencia?carrera=...&por_sexo=1``: puntaje promedio por año y carrera (pestaña 1).
+- ``/api/regiones?anio=2025``: estudiantes por región (pestaña 2).
+- ``/api/sexo?carrera=...``: proporción por sexo (pestaña 3).
+- ``/api/dependencia?carrera=...&anio=...``: estudiantes por dependencia (pestaña 4).
+- ``/api/ingreso?anio=2025&ingreso=...``: estudiantes por tipo de ingreso o, con
+  ``ingreso``, por carrera dentro de ese tipo (pestaña 5).
+
+Las respuestas se calculan desde los agregados precalculados de
+``agregados.py``, nunca desde la base por fila. Cada respuesta lleva un ETag
+derivado de la versión de los datos, la ruta y los filtros. Si el cliente
+envía ``If-None-Match`` con ese ETag, recibe ``304 Not Modified`` sin cuerpo.
+"""
+
+import argparse
+import hashlib
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import agregados
+from cache_resultados import version_datos
+
+
+# ---------------------------
+# Agregados por versión de datos
+# ---------------------------
+
+class EstadoAgregados:
+    """Mantiene los agregados de la versión actual y los reconstruye si cambian los datos."""
+
+    def __init__(self):
+        self._version = None
+        self._tablas = None
+        self._candado = threading.Lock()
+
+    def obtener(self):
+        version = version_datos()
+        with self._candado:
+            if version != self._version:
+                self._tablas = agregados.construir_agregados(agregados.cargar_base())
+                self._version = version
+            return self._version, self._tablas
+
+
+ESTADO = EstadoAgregados()
+
+
+# ---------------------------
+# Parámetros
+# ---------------------------
+
+def _lista(params, nombre):
+    valores = params.get(nombre)
+    return valores or None
+
+
+def _entero(params, nombre, defecto=None):
+    valores = params.get(nombre)
+    if not valores:
+        return defecto
+    try:
+        return int(valores[-1])
+    except ValueError:
+        raise ValueError(f"El parámetro '{nombre}' debe ser un número entero.") from None
+
+
+def _texto(params, nombre):
+    valores = params.get(nombre)
+    return valores[-1] if valores else None
+
+
+def _bandera(params, nombre):
+    return _texto(params, nombre) in ("1", "true", "si", "sí")
+
+
+# ---------------------------
+# Rutas
+# ---------------------------
+
+def _anios(params):
+    anio = _entero(params, "anio")
+    return None if anio is None else [anio]
+
+
+RUTAS = {
+    "/api/tendencia": lambda tablas, p: agregados.tendencia_puntaje(
+        tablas, carreras=_lista(p, "carrera"), por_sexo=_bandera(p, "por_sexo")
+    ),
+    "/api/regiones": lambda tablas, p: agregados.conteo_regiones(tablas, anio=_entero(p, "anio", 2025)),
+    "/api/sexo": lambda tablas, p: agregados.proporcion_sexo(tablas, carreras=_lista(p, "carrera")),
+    "/api/dependencia": lambda tablas, p: agregados.conteo_dependencia(
+        tablas, carreras=_lista(p, "carrera"), anios=_anios(p)
+    ),
+    "/api/ingreso": lambda tablas, p: agregados.conteo_ingreso(
+        tablas, anio=_entero(p, "anio", 2025), ingreso=_texto(p, "ingreso")
+    ),
+    "/api/carreras": lambda tablas, p: agregados.carreras(tablas),
+}
+
+
+def calcular_etag(version, ruta, params):
+    filtros = sorted((nombre, tuple(valores)) for nombre, valores in params.items())
+    texto = f"{version}|{ruta}|{filtros!r}"
+    return '"' + hashlib.sha256(texto.encode()).hexdigest()[:32] + '"'
+
+
+def _coincide_etag(encabezado, etag):
+    if not encabezado:
+        return False
+    candidatos = [c.strip() for c in encabezado.split(",")]
+    return "*" in candidatos or any(c.removeprefix("W/") == etag for c in candidatos)
+
+
+class ManejadorAPI(BaseHTTPRequestHandler):
+    server_version = "DatavizAPI/1.0"
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = parse_qs(url.query)
+
+        if url.path == "/api/version":
+            self._responder(200, {"version": version_datos()})
+            return
+        consulta = RUTAS.get(url.path)
+        if consulta is None:
+            self._responder(404, {"error": f"Ruta desconocida: {url.path}", "rutas": sorted(RUTAS)})
+            return
+
+        # La revalidación no necesita calcular nada: basta con la versión de los datos
+        etag = calcular_etag(version_datos(), url.path, params)
+        if _coincide_etag(self.headers.get("If-None-Match"), etag):
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Cache-Control", "no-cache")
+            self.end_headers()
+            return
+
+        version, tablas = ESTADO.obtener()
+        etag = calcular_etag(version, url.path, params)
+        try:
+            resultado = consulta(tablas, params)
+        except ValueError as e:
+            self._responder(400, {"error": str(e)})
+            return
+
+        datos = resultado if isinstance(resultado, list) else json.loads(
+            resultado.to_json(orient="records", force_ascii=False)
+        )
+        self._responder(200, {"version": version, "filtros": params, "datos": datos}, etag)
+
+    def _responder(self, estado, contenido, etag=None):
+        cuerpo = json.dumps(contenido, ensure_ascii=False).encode("utf-8")
+        self.send_response(estado)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(cuerpo)))
+        if etag is not None:
+            self.send_header("ETag", etag)
+            self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        self.wfile.write(cuerpo)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="API JSON con los agregados del dashboard.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--puerto", type=int, default=8502)
+    args = parser.parse_args()
+
+    # Precalcula los agregados antes de aceptar conexiones
+    ESTADO.obtener()
+    servidor = ThreadingHTTPServer((args.host, args.puerto), ManejadorAPI)
+    print(f"API de agregados en http://{args.host}:{args.puerto}/api/")
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        servidor.server_close()
+
+
+if __name__ == "__main__":
+    main()
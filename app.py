@@ -1,81 +1,102 @@
 import streamlit as st
 import pandas as pd
 import plotly.express as px
-import geopandas as gpd
 import glob
+import importlib
+import io
+import os
+import threading
 import numpy as np
-from wordcloud import WordCloud
-import matplotlib.pyplot as plt
+from agregados import (
+    cargar_base, construir_agregados, construir_indice_puntajes, conteo_dependencia,
+    conteo_ingreso, conteo_regiones, cuantil_puntaje, diccionario_regiones,
+    matriz_region_carrera, normalizar_matriz, ordenar_por_clustering, percentil_puntaje,
+    proporcion_sexo, puntajes_indice, recortar_top_k, tendencia_puntaje, top_carreras_region
+)
+from cache_resultados import PATRON_GEOJSON, cache_persistente, version_datos
+from grafo_reactivo import GrafoReactivo, almacen_nodos
 
 # ---------------------------
 # Cargar datos
 # ---------------------------
+# El GeoJSON recibe la versión de los datos (version_datos()) aunque no la use:
+# así la copia de st.cache_data se renueva cuando cambian los archivos.
 
+# Se devuelve el GeoJSON ya disuelto por región (un dict simple): con la caché
+# en disco caliente el mapa se dibuja sin importar geopandas.
 @st.cache_data
-def cargar_datos():
-    return pd.read_excel("bbdd/base_total_homologada.xlsx")
+@cache_persistente
+def cargar_geojson_regiones(version):
+    import geopandas as gpd
 
-@st.cache_data
-def cargar_geojson_regiones():
-    geojson_files = glob.glob("comunas_geojson/R*.geojson")
+    geojson_files = glob.glob(PATRON_GEOJSON)
     comunas = gpd.GeoDataFrame(pd.concat(
         [gpd.read_file(f) for f in geojson_files], ignore_index=True
     ))
     comunas["REGION"] = comunas["REGION"].astype(str).str.zfill(2)
     regiones = comunas.dissolve(by="REGION", as_index=False)
-    return regiones
-
-base_total = cargar_datos()
-regiones = cargar_geojson_regiones()
+    return regiones[["REGION", "geometry"]].__geo_interface__
 
+# La nube de palabras se guarda como PNG: con la caché en disco caliente no se
+# importan wordcloud ni matplotlib.
 @st.cache_data
-def cargar_datos():
-    return pd.read_excel("bbdd/base_total_homologada.xlsx")
+@cache_persistente
+def generar_nube_palabras(frecuencias):
+    from wordcloud import WordCloud
 
-base_total = cargar_datos()
+    nube = WordCloud(width=1000, height=500, background_color="white")
+    imagen = nube.generate_from_frequencies(frecuencias).to_image()
+    buffer = io.BytesIO()
+    imagen.save(buffer, format="PNG")
+    return buffer.getvalue()
 
 # ---------------------------
-# Limpieza y transformación inicial
+# Librerías pesadas
 # ---------------------------
-base_total["ANIO"] = pd.to_numeric(base_total["ANIO"], errors="coerce").fillna(0).astype(int)
-base_total = base_total[base_total["ANIO"].isin([2023, 2024, 2025])].copy()
-base_total["CODIGO_REGION"] = pd.to_numeric(base_total["CODIGO_REGION"], errors="coerce").astype("Int64")
+# Solo se necesitan cuando falta un resultado en caché. Se importan en segundo
+# plano al terminar la primera ejecución del proceso, para no retrasar el
+# primer render (DATAVIZ_PRECALENTAR=0 lo desactiva).
+LIBRERIAS_PESADAS = ["geopandas", "wordcloud"]
+
+@st.cache_resource
+def precalentar_librerias():
+    if os.environ.get("DATAVIZ_PRECALENTAR") == "0":
+        return None
+
+    def importar():
+        for modulo in LIBRERIAS_PESADAS:
+            try:
+                importlib.import_module(modulo)
+            except ImportError:
+                pass
+
+    hilo = threading.Thread(target=importar, name="precalentar-librerias", daemon=True)
+    hilo.start()
+    return hilo
 
 # ---------------------------
-# Definición de base_2025 
+# Grafo de dependencias
 # ---------------------------
-base_2025 = base_total[base_total["ANIO"] == 2025].copy()
-
-# Diccionario: código → nombre oficial de región
-diccionario_regiones = {
-    "01": "Tarapacá",
-    "02": "Antofagasta",
-    "03": "Atacama",
-    "04": "Coquimbo",
-    "05": "Valparaíso",
-    "06": "O'Higgins",
-    "07": "Maule",
-    "08": "Biobío",
-    "09": "La Araucanía",
-    "10": "Los Lagos",
-    "11": "Aysén",
-    "12": "Magallanes",
-    "13": "Metropolitana",
-    "14": "Los Ríos",
-    "15": "Arica y Parinacota",
-    "16": "Ñuble",
-    "17": "Los Andes"
-}
-
+# Cada tabla o figura derivada es un nodo: solo se recalcula si cambian sus
+# entradas (widgets o versión de los datos) o los nodos de los que depende.
+# Los valores de los nodos se comparten entre sesiones: no modificarlos en el lugar.
+grafo = GrafoReactivo(almacen_nodos(), st.session_state.setdefault("grafo_previas", {}))
+version = version_datos()
 
+# La base por fila se carga igual que en la API JSON (agregados.cargar_base).
+# No usa st.cache_data: la copia en memoria la guarda el nodo (por versión de
+# los datos) y la persistente, la caché en disco
+base_total = grafo.nodo("base_total", cargar_base, entradas={"datos": version})
 
 # ---------------------------
-# Limpieza de datos base
+# Definición de base_2025 
 # ---------------------------
-base_total["ANIO"] = pd.to_numeric(base_total["ANIO"], errors="coerce")
-base_total["ANIO"] = base_total["ANIO"].fillna(0).astype(int)
-base_total = base_total[base_total["ANIO"].isin([2023, 2024, 2025])].copy()
-base_total["CODIGO_REGION"] = pd.to_numeric(base_total["CODIGO_REGION"], errors="coerce").astype("Int64")
+base_2025 = grafo.nodo(
+    "base_2025", lambda: base_total[base_total["ANIO"] == 2025].copy(), depende_de=["base_total"]
+)
+
+# Agregados compartidos con la API JSON (api_agregados.py)
+agregados = grafo.nodo("agregados", lambda: construir_agregados(base_total), depende_de=["base_total"])
 
 # ---------------------------
 # Logo superior
@@ -202,20 +223,26 @@ with tab1:
     # ---------------------------
     # Gráfico 1: Línea por carrera
     # ---------------------------
-    df_puntaje = base_total[base_total["CARRERA"].isin(carreras_seleccionadas)].copy()
-    df_linea = df_puntaje.groupby(["ANIO", "CARRERA"])["PTJE_PONDERADO"].mean().reset_index()
-
-    fig_linea = px.line(
-        df_linea,
-        x="ANIO", y="PTJE_PONDERADO", color="CARRERA",
-        markers=True,
-        labels={"PTJE_PONDERADO": "Puntaje Promedio", "ANIO": "Año"},
-        title="Tendencia Puntaje Promedio por Carrera"
-    )
-    fig_linea.update_layout(
-        yaxis=dict(range=[500, 1000]),
-        xaxis=dict(tickmode='array', tickvals=[2023, 2024, 2025])
+    df_linea = grafo.nodo(
+        "df_linea", lambda: tendencia_puntaje(agregados, carreras_seleccionadas),
+        entradas={"carreras_tab1": carreras_seleccionadas}, depende_de=["agregados"]
     )
+
+    def graficar_linea():
+        fig_linea = px.line(
+            df_linea,
+            x="ANIO", y="PTJE_PONDERADO", color="CARRERA",
+            markers=True,
+            labels={"PTJE_PONDERADO": "Puntaje Promedio", "ANIO": "Año"},
+            title="Tendencia Puntaje Promedio por Carrera"
+        )
+        fig_linea.update_layout(
+            yaxis=dict(range=[500, 1000]),
+            xaxis=dict(tickmode='array', tickvals=[2023, 2024, 2025])
+        )
+        return fig_linea
+
+    fig_linea = grafo.nodo("fig_linea", graficar_linea, depende_de=["df_linea"])
     st.plotly_chart(fig_linea, use_container_width=True)
 
     # ------------------------------
@@ -248,39 +275,42 @@ with tab1:
     Permite observar si existen **diferencias significativas por sexo** dentro de cada carrera.
     """)
 
-    df_sexo = base_total[
-        base_total["CARRERA"].isin(carreras_seleccionadas) &
-        base_total["SEXO"].notna() &
-        base_total["PTJE_PONDERADO"].notna()
-    ].copy()
-
-    df_barras = df_sexo.groupby(["ANIO", "CARRERA", "SEXO"])["PTJE_PONDERADO"].mean().reset_index()
-
-    df_barras["SEXO"] = pd.Categorical(df_barras["SEXO"], categories=["MASCULINO", "FEMENINO"], ordered=True)
-
-    fig_barras = px.bar(
-        df_barras,
-        x="ANIO", y="PTJE_PONDERADO", color="SEXO",
-        barmode="group", text_auto=".1f",
-        facet_col="CARRERA", facet_col_wrap=2,
-        title="Promedio Puntaje Ponderado PAES por Sexo y Carrera",
-        color_discrete_map={
-            "MASCULINO": "#2C8DC5",
-            "FEMENINO": "#A040AC"
-        },
-        labels={
-            "ANIO": "Año",
-            "PTJE_PONDERADO": "Puntaje Promedio",
-            "SEXO": "Sexo"
-        }
-    )
+    def calcular_df_barras():
+        df_barras = tendencia_puntaje(agregados, carreras_seleccionadas, por_sexo=True)
+        df_barras["SEXO"] = pd.Categorical(df_barras["SEXO"], categories=["MASCULINO", "FEMENINO"], ordered=True)
+        return df_barras
 
-    fig_barras.update_layout(
-        yaxis=dict(range=[500, 1000]),
-        xaxis=dict(tickmode='array', tickvals=[2023, 2024, 2025]),
-        legend=dict(orientation="h", y=-0.25, x=0.5, xanchor="center")
+    df_barras = grafo.nodo(
+        "df_barras", calcular_df_barras,
+        entradas={"carreras_tab1": carreras_seleccionadas}, depende_de=["agregados"]
     )
 
+    def graficar_barras():
+        fig_barras = px.bar(
+            df_barras,
+            x="ANIO", y="PTJE_PONDERADO", color="SEXO",
+            barmode="group", text_auto=".1f",
+            facet_col="CARRERA", facet_col_wrap=2,
+            title="Promedio Puntaje Ponderado PAES por Sexo y Carrera",
+            color_discrete_map={
+                "MASCULINO": "#2C8DC5",
+                "FEMENINO": "#A040AC"
+            },
+            labels={
+                "ANIO": "Año",
+                "PTJE_PONDERADO": "Puntaje Promedio",
+                "SEXO": "Sexo"
+            }
+        )
+
+        fig_barras.update_layout(
+            yaxis=dict(range=[500, 1000]),
+            xaxis=dict(tickmode='array', tickvals=[2023, 2024, 2025]),
+            legend=dict(orientation="h", y=-0.25, x=0.5, xanchor="center")
+        )
+        return fig_barras
+
+    fig_barras = grafo.nodo("fig_barras", graficar_barras, depende_de=["df_barras"])
     st.plotly_chart(fig_barras, use_container_width=True)
 
     # ---------------------------
@@ -328,31 +358,33 @@ with tab1:
 with tab2:
     st.header("Estudiantes por Región (2025)")
 
-    base_2025_map = base_total[base_total["ANIO"] == 2025].copy()
-    base_2025_map["CODIGO_REGION"] = base_2025_map["CODIGO_REGION"].astype(str).str.zfill(2)
-    base_2025_map["n"] = 1
-
-    region_count = base_2025_map.groupby("CODIGO_REGION")["n"].sum().reset_index(name="N_ESTUDIANTES")
-    region_count["NOMBRE_REGION"] = region_count["CODIGO_REGION"].map(diccionario_regiones).fillna(region_count["CODIGO_REGION"])
-
-    gdf_regiones = regiones.merge(region_count, left_on="REGION", right_on="CODIGO_REGION", how="left")
-    gdf_regiones["N_ESTUDIANTES"] = gdf_regiones["N_ESTUDIANTES"].fillna(0)
-    gdf_regiones["NOMBRE_REGION"] = gdf_regiones["CODIGO_REGION"].map(diccionario_regiones).fillna(gdf_regiones["CODIGO_REGION"])
-
-    geojson_regiones = gdf_regiones.__geo_interface__
-
-    fig_mapa = px.choropleth_mapbox(
-        gdf_regiones,
-        geojson=geojson_regiones,
-        locations=gdf_regiones.index,
-        color="N_ESTUDIANTES",
-        mapbox_style="carto-positron",
-        zoom=4,
-        center={"lat": -35.5, "lon": -71.5},
-        color_continuous_scale="Blues",
-        title="Estudiantes por Región – Año 2025"
-    )
-    fig_mapa.update_layout(margin={"r": 0, "t": 40, "l": 0, "b": 0})
+    region_count = grafo.nodo("region_count", lambda: conteo_regiones(agregados, 2025), depende_de=["agregados"])
+
+    # Solo el mapa usa el GeoJSON: se carga aquí, después del primer render
+    regiones = grafo.nodo("regiones", lambda: cargar_geojson_regiones(version), entradas={"datos": version})
+
+    def graficar_mapa():
+        df_regiones = pd.DataFrame({"REGION": [f["properties"]["REGION"] for f in regiones["features"]]})
+        df_regiones = df_regiones.merge(region_count, left_on="REGION", right_on="CODIGO_REGION", how="left")
+        df_regiones["N_ESTUDIANTES"] = df_regiones["N_ESTUDIANTES"].fillna(0)
+        df_regiones["NOMBRE_REGION"] = df_regiones["REGION"].map(diccionario_regiones).fillna(df_regiones["REGION"])
+
+        fig_mapa = px.choropleth_mapbox(
+            df_regiones,
+            geojson=regiones,
+            locations="REGION",
+            featureidkey="properties.REGION",
+            color="N_ESTUDIANTES",
+            mapbox_style="carto-positron",
+            zoom=4,
+            center={"lat": -35.5, "lon": -71.5},
+            color_continuous_scale="Blues",
+            title="Estudiantes por Región – Año 2025"
+        )
+        fig_mapa.update_layout(margin={"r": 0, "t": 40, "l": 0, "b": 0})
+        return fig_mapa
+
+    fig_mapa = grafo.nodo("fig_mapa", graficar_mapa, depende_de=["regiones", "region_count"])
     st.plotly_chart(fig_mapa, use_container_width=True)
 
     # ---------------------------
@@ -360,24 +392,27 @@ with tab2:
     # ---------------------------
     st.subheader("Distribución de Estudiantes por Región (2025)")
 
-    region_count_sorted = region_count.sort_values("N_ESTUDIANTES", ascending=False)
+    def graficar_barras_region():
+        region_count_sorted = region_count.sort_values("N_ESTUDIANTES", ascending=False)
 
-    fig_barras_region = px.bar(
-        region_count_sorted,
-        x="NOMBRE_REGION",
-        y="N_ESTUDIANTES",
-        text_auto=True,
-        labels={"NOMBRE_REGION": "Región", "N_ESTUDIANTES": "Cantidad de Estudiantes"},
-        title="Cantidad de Estudiantes por Región (2025)"
-    )
+        fig_barras_region = px.bar(
+            region_count_sorted,
+            x="NOMBRE_REGION",
+            y="N_ESTUDIANTES",
+            text_auto=True,
+            labels={"NOMBRE_REGION": "Región", "N_ESTUDIANTES": "Cantidad de Estudiantes"},
+            title="Cantidad de Estudiantes por Región (2025)"
+        )
 
-    fig_barras_region.update_layout(
-        xaxis_title="Región",
-        yaxis_title="Cantidad de Estudiantes",
-        margin=dict(t=40, b=20),
-        template="simple_white"
-    )
+        fig_barras_region.update_layout(
+            xaxis_title="Región",
+            yaxis_title="Cantidad de Estudiantes",
+            margin=dict(t=40, b=20),
+            template="simple_white"
+        )
+        return fig_barras_region
 
+    fig_barras_region = grafo.nodo("fig_barras_region", graficar_barras_region, depende_de=["region_count"])
     st.plotly_chart(fig_barras_region, use_container_width=True)
 
 # ---------------------------
@@ -404,45 +439,42 @@ with tab3:
         ### 📘 Gráfico 1: Proporción de estudiantes por sexo (stacked)
         """)
 
-    # Base común filtrada
-    df_sexo = base_total[base_total["CARRERA"].isin(carreras_seleccionadas)].copy()
-
     # ==============================
     # Gráfico 1: Stacked bar por proporción
     # ==============================
-    df_n = df_sexo.groupby(["ANIO", "SEXO", "CARRERA"]).size().reset_index(name="N")
-    df_n["TOTAL"] = df_n.groupby(["ANIO", "CARRERA"])["N"].transform("sum")
-    df_n["PROPORCION"] = df_n["N"] / df_n["TOTAL"]
-    df_n["TEXTO"] = (df_n["PROPORCION"] * 100).round(1).astype(str) + "%"
-
-    df_n["SEXO"] = pd.Categorical(df_n["SEXO"], categories=["MASCULINO", "FEMENINO"], ordered=True)
-    df_n = df_n.sort_values(["ANIO", "CARRERA", "SEXO"])
-
-    fig_stacked = px.bar(
-        df_n,
-        x="ANIO",
-        y="PROPORCION",
-        color="SEXO",
-        text="TEXTO",
-        facet_col="CARRERA",
-        facet_col_wrap=2,
-        title="Proporción de Postulantes por Sexo (Stacked)",
-        labels={"PROPORCION": "Proporción", "ANIO": "Año", "SEXO": "Sexo"},
-        color_discrete_map={
-            "MASCULINO": "#2C8DC5",
-            "FEMENINO": "#A040AC"
-        }
+    df_n = grafo.nodo(
+        "df_n", lambda: proporcion_sexo(agregados, carreras_seleccionadas),
+        entradas={"carreras_tab3": carreras_seleccionadas}, depende_de=["agregados"]
     )
 
-    fig_stacked.update_layout(
-        barmode="stack",
-        uniformtext_minsize=8,
-        uniformtext_mode='show',
-        yaxis=dict(tickformat=".0%", range=[0, 1]),
-        xaxis=dict(tickmode="array", tickvals=[2023, 2024, 2025]),
-        legend=dict(orientation="h", y=-0.25, x=0.5, xanchor="center")
-    )
+    def graficar_stacked():
+        fig_stacked = px.bar(
+            df_n,
+            x="ANIO",
+            y="PROPORCION",
+            color="SEXO",
+            text="TEXTO",
+            facet_col="CARRERA",
+            facet_col_wrap=2,
+            title="Proporción de Postulantes por Sexo (Stacked)",
+            labels={"PROPORCION": "Proporción", "ANIO": "Año", "SEXO": "Sexo"},
+            color_discrete_map={
+                "MASCULINO": "#2C8DC5",
+                "FEMENINO": "#A040AC"
+            }
+        )
+
+        fig_stacked.update_layout(
+            barmode="stack",
+            uniformtext_minsize=8,
+            uniformtext_mode='show',
+            yaxis=dict(tickformat=".0%", range=[0, 1]),
+            xaxis=dict(tickmode="array", tickvals=[2023, 2024, 2025]),
+            legend=dict(orientation="h", y=-0.25, x=0.5, xanchor="center")
+        )
+        return fig_stacked
 
+    fig_stacked = grafo.nodo("fig_stacked", graficar_stacked, depende_de=["df_n"])
     st.plotly_chart(fig_stacked, use_container_width=True)
 
     # ---------------------------
@@ -485,39 +517,46 @@ with tab3:
     ---
     """)
 
-    df_box = df_sexo[
-        df_sexo["PTJE_PONDERADO"].notna() &
-        df_sexo["SEXO"].notna()
-    ].copy()
-
-    df_box["SEXO"] = pd.Categorical(df_box["SEXO"], categories=["MASCULINO", "FEMENINO"], ordered=True)
-
-    fig_box = px.box(
-        df_box,
-        x="CARRERA",
-        y="PTJE_PONDERADO",
-        color="SEXO",
-        points="all",
-        title="Distribución de Puntajes Ponderados por Sexo y Carrera",
-        labels={
-            "PTJE_PONDERADO": "Puntaje Ponderado",
-            "CARRERA": "Carrera",
-            "SEXO": "Sexo"
-        },
-        color_discrete_map={
-            "MASCULINO": "#2C8DC5",
-            "FEMENINO": "#A040AC"
-        }
-    )
+    def graficar_box():
+        df_box = base_total[
+            base_total["CARRERA"].isin(carreras_seleccionadas) &
+            base_total["PTJE_PONDERADO"].notna() &
+            base_total["SEXO"].notna()
+        ].copy()
+
+        df_box["SEXO"] = pd.Categorical(df_box["SEXO"], categories=["MASCULINO", "FEMENINO"], ordered=True)
+
+        fig_box = px.box(
+            df_box,
+            x="CARRERA",
+            y="PTJE_PONDERADO",
+            color="SEXO",
+            points="all",
+            title="Distribución de Puntajes Ponderados por Sexo y Carrera",
+            labels={
+                "PTJE_PONDERADO": "Puntaje Ponderado",
+                "CARRERA": "Carrera",
+                "SEXO": "Sexo"
+            },
+            color_discrete_map={
+                "MASCULINO": "#2C8DC5",
+                "FEMENINO": "#A040AC"
+            }
+        )
 
-    fig_box.update_layout(
-        boxmode="group",
-        xaxis_title="Carrera",
-        yaxis_title="Puntaje Ponderado",
-        yaxis=dict(range=[500, 1000]),
-        legend=dict(orientation="h", y=-0.25, x=0.5, xanchor="center")
-    )
+        fig_box.update_layout(
+            boxmode="group",
+            xaxis_title="Carrera",
+            yaxis_title="Puntaje Ponderado",
+            yaxis=dict(range=[500, 1000]),
+            legend=dict(orientation="h", y=-0.25, x=0.5, xanchor="center")
+        )
+        return fig_box
 
+    fig_box = grafo.nodo(
+        "fig_box", graficar_box,
+        entradas={"carreras_tab3": carreras_seleccionadas}, depende_de=["base_total"]
+    )
     st.plotly_chart(fig_box, use_container_width=True)
 
     # ---------------------------
@@ -525,20 +564,24 @@ with tab3:
     # ---------------------------
     st.subheader("📝 Resumen automático: puntajes por sexo")
 
+    indice_puntajes = grafo.nodo(
+        "indice_puntajes", lambda: construir_indice_puntajes(base_total), depende_de=["base_total"]
+    )
+
     resumen_boxplot = []
 
     for carrera in carreras_seleccionadas:
         for sexo in ["MASCULINO", "FEMENINO"]:
-            subset = df_box[(df_box["CARRERA"] == carrera) & (df_box["SEXO"] == sexo)]
+            puntajes = puntajes_indice(indice_puntajes, carrera, sexo=sexo)
 
-            if subset.empty:
+            if len(puntajes) == 0:
                 resumen_boxplot.append(f"- No hay datos para **{sexo.lower()}s en {carrera}**.")
                 continue
 
-            media = subset["PTJE_PONDERADO"].mean()
-            mediana = subset["PTJE_PONDERADO"].median()
-            q1 = subset["PTJE_PONDERADO"].quantile(0.25)
-            q3 = subset["PTJE_PONDERADO"].quantile(0.75)
+            media = puntajes.mean()
+            mediana = cuantil_puntaje(puntajes, 0.5)
+            q1 = cuantil_puntaje(puntajes, 0.25)
+            q3 = cuantil_puntaje(puntajes, 0.75)
             dispersion = q3 - q1
             nivel_dispersion = "alta" if dispersion > 80 else "baja"
 
@@ -548,6 +591,48 @@ with tab3:
 
     st.markdown("\n".join(resumen_boxplot))
 
+    # ---------------------------
+    # ¿Dónde queda mi puntaje?
+    # ---------------------------
+    st.subheader("🎯 ¿Dónde queda mi puntaje?")
+    st.markdown("""
+    Ingresa un puntaje ponderado para conocer en qué **percentil** quedaría dentro de los postulantes
+    de una carrera, año (o todos) y sexo.
+    """)
+
+    col_carrera, col_anio, col_sexo, col_puntaje = st.columns(4)
+    carrera_percentil = col_carrera.selectbox(
+        "Carrera",
+        carreras_disponibles,
+        index=carreras_disponibles.index("Ingeniería Comercial") if "Ingeniería Comercial" in carreras_disponibles else 0,
+        key="carrera_percentil"
+    )
+    anio_percentil = col_anio.selectbox("Año", [2025, 2024, 2023, "TODOS"], key="anio_percentil")
+    sexo_percentil = col_sexo.selectbox("Sexo", ["TODOS", "FEMENINO", "MASCULINO"], key="sexo_percentil")
+    puntaje_usuario = col_puntaje.number_input(
+        "Puntaje", min_value=100.0, max_value=1000.0, value=720.0, step=1.0, key="puntaje_percentil"
+    )
+
+    puntajes_grupo = puntajes_indice(
+        indice_puntajes,
+        carrera_percentil,
+        anio=None if anio_percentil == "TODOS" else anio_percentil,
+        sexo=None if sexo_percentil == "TODOS" else sexo_percentil
+    )
+    periodo_percentil = "todos los años" if anio_percentil == "TODOS" else anio_percentil
+
+    if len(puntajes_grupo) == 0:
+        st.info(f"No hay puntajes registrados para **{carrera_percentil}** en {periodo_percentil}.")
+    else:
+        percentil = percentil_puntaje(puntajes_grupo, puntaje_usuario)
+        st.metric("Percentil", f"{percentil:.1f}")
+        st.markdown(
+            f"Un puntaje de **{puntaje_usuario:.0f}** en **{carrera_percentil}** ({periodo_percentil}) "
+            f"es mayor o igual al de **{percentil:.1f}%** de los {len(puntajes_grupo)} postulantes "
+            f"(mediana: {cuantil_puntaje(puntajes_grupo, 0.5):.1f}; "
+            f"Q1: {cuantil_puntaje(puntajes_grupo, 0.25):.1f}; Q3: {cuantil_puntaje(puntajes_grupo, 0.75):.1f})."
+        )
+
 
 # ---------------------------
 # Tab 4: Dependencia
@@ -555,12 +640,16 @@ with tab3:
 with tab4:
     st.header("📊 Matrícula por Grupo de Dependencia e Ingreso")
 
-    df_dep = base_total.groupby(["ANIO", "GRUPO_DEPENDENCIA_EST"]).size().reset_index(name="N_ESTUDIANTES")
-    fig_dep = px.line(
-        df_dep,
-        x="ANIO", y="N_ESTUDIANTES", color="GRUPO_DEPENDENCIA_EST", markers=True,
-        labels={"N_ESTUDIANTES": "Cantidad de Estudiantes", "ANIO": "Año", "GRUPO_DEPENDENCIA_EST": "Dependencia"},
-        title="Evolución de la matrícula por dependencia del establecimiento"
+    df_dep = grafo.nodo("df_dep", lambda: conteo_dependencia(agregados), depende_de=["agregados"])
+    fig_dep = grafo.nodo(
+        "fig_dep",
+        lambda: px.line(
+            df_dep,
+            x="ANIO", y="N_ESTUDIANTES", color="GRUPO_DEPENDENCIA_EST", markers=True,
+            labels={"N_ESTUDIANTES": "Cantidad de Estudiantes", "ANIO": "Año", "GRUPO_DEPENDENCIA_EST": "Dependencia"},
+            title="Evolución de la matrícula por dependencia del establecimiento"
+        ),
+        depende_de=["df_dep"]
     )
     st.plotly_chart(fig_dep, use_container_width=True, key="fig_dep")
 
@@ -573,32 +662,39 @@ with tab4:
        default=["Sociología", "Ingeniería Civil Biomédica", "Ingeniería Comercial"],
     )
 
-    df_densidad = base_total[
-        (base_total["ANIO"] == 2025) &
-        (base_total["CARRERA"].isin(carreras_filtradas)) &
-        (base_total["PTJE_PONDERADO"].notna()) &
-        (base_total["GRUPO_DEPENDENCIA_EST"] != "SIN INFORMACIÓN")
-    ].copy()
-
-    fig_violin = px.violin(
-        df_densidad,
-        x="PTJE_PONDERADO",
-        color="GRUPO_DEPENDENCIA_EST",
-        facet_row="CARRERA",
-        box=True,
-        points="all",
-        orientation="h",
-        labels={
-            "PTJE_PONDERADO": "Puntaje Ponderado",
-            "GRUPO_DEPENDENCIA_EST": "Dependencia"
-        },
-        title="Distribución del Puntaje Ponderado por Carrera y Dependencia (2025)"
-    )
+    def graficar_violin():
+        df_densidad = base_total[
+            (base_total["ANIO"] == 2025) &
+            (base_total["CARRERA"].isin(carreras_filtradas)) &
+            (base_total["PTJE_PONDERADO"].notna()) &
+            (base_total["GRUPO_DEPENDENCIA_EST"] != "SIN INFORMACIÓN")
+        ]
+
+        fig_violin = px.violin(
+            df_densidad,
+            x="PTJE_PONDERADO",
+            color="GRUPO_DEPENDENCIA_EST",
+            facet_row="CARRERA",
+            box=True,
+            points="all",
+            orientation="h",
+            labels={
+                "PTJE_PONDERADO": "Puntaje Ponderado",
+                "GRUPO_DEPENDENCIA_EST": "Dependencia"
+            },
+            title="Distribución del Puntaje Ponderado por Carrera y Dependencia (2025)"
+        )
 
-    fig_violin.update_layout(
-        height=400 + 200 * len(carreras_filtradas),
-        margin=dict(t=60, b=40, l=40, r=40),
-        template="simple_white"
+        fig_violin.update_layout(
+            height=400 + 200 * len(carreras_filtradas),
+            margin=dict(t=60, b=40, l=40, r=40),
+            template="simple_white"
+        )
+        return fig_violin
+
+    fig_violin = grafo.nodo(
+        "fig_violin", graficar_violin,
+        entradas={"carreras_filtradas": carreras_filtradas}, depende_de=["base_total"]
     )
     st.plotly_chart(fig_violin, use_container_width=True, key="fig_violin")
 
@@ -610,24 +706,25 @@ with tab4:
 with tab5:
     st.subheader("📈 Distribución por Tipo de Ingreso (2025)")
 
-       # Agrupar por tipo de ingreso
-    ingreso_counts = base_2025.groupby("INGRESO").size().reset_index(name="CANTIDAD")
+    # Cantidad y porcentaje sobre el total por tipo de ingreso
+    ingreso_counts = grafo.nodo("ingreso_counts", lambda: conteo_ingreso(agregados, 2025), depende_de=["agregados"])
 
-# Calcular el porcentaje sobre el total
-    ingreso_counts["PORCENTAJE"] = ingreso_counts["CANTIDAD"] / ingreso_counts["CANTIDAD"].sum()
+    def graficar_treemap():
+        fig_treemap_tab5 = px.treemap(
+            ingreso_counts,
+            path=["INGRESO"],
+            values="CANTIDAD",  # Esto determina el tamaño de los rectángulos
+            title="Distribución de estudiantes por tipo de ingreso (2025)"
+        )
 
-    fig_treemap_tab5 = px.treemap(
-        ingreso_counts,
-        path=["INGRESO"],
-        values="CANTIDAD",  # Esto determina el tamaño de los rectángulos
-        title="Distribución de estudiantes por tipo de ingreso (2025)"
-    )
+        # Mostrar porcentaje manualmente en la etiqueta
+        fig_treemap_tab5.update_traces(
+            hovertemplate='<b>%{label}</b><br>%{value} estudiantes<br>%{customdata[0]:.1%} del total',
+            customdata=ingreso_counts[["PORCENTAJE"]].values
+        )
+        return fig_treemap_tab5
 
-    # Mostrar porcentaje manualmente en la etiqueta
-    fig_treemap_tab5.update_traces(
-        hovertemplate='<b>%{label}</b><br>%{value} estudiantes<br>%{customdata[0]:.1%} del total',
-        customdata=ingreso_counts[["PORCENTAJE"]].values
-    )
+    fig_treemap_tab5 = grafo.nodo("fig_treemap_tab5", graficar_treemap, depende_de=["ingreso_counts"])
 
     st.plotly_chart(fig_treemap_tab5, use_container_width=True, key="fig_treemap_tab5")
 
@@ -642,64 +739,65 @@ with tab5:
     tipos_ingreso = sorted(base_2025["INGRESO"].dropna().unique())
     ingreso_seleccionado = st.selectbox("Selecciona un tipo de ingreso", tipos_ingreso)
 
-    df_sankey = base_2025[
-        (base_2025["INGRESO"] == ingreso_seleccionado) &
-        base_2025["CARRERA"].notna()
-    ].copy()
+    def graficar_sankey():
+        import plotly.graph_objects as go
 
-    df_grouped = df_sankey.groupby(["INGRESO", "CARRERA"]).size().reset_index(name="count")
+        df_grouped = conteo_ingreso(agregados, 2025, ingreso_seleccionado).rename(columns={"CANTIDAD": "count"})
 
-    all_labels = list(pd.unique(df_grouped["INGRESO"].tolist() + df_grouped["CARRERA"].tolist()))
-    label_to_index = {label: i for i, label in enumerate(all_labels)}
+        all_labels = list(pd.unique(df_grouped["INGRESO"].tolist() + df_grouped["CARRERA"].tolist()))
+        label_to_index = {label: i for i, label in enumerate(all_labels)}
 
-    source = df_grouped["INGRESO"].map(label_to_index)
-    target = df_grouped["CARRERA"].map(label_to_index)
-    value = df_grouped["count"]
+        source = df_grouped["INGRESO"].map(label_to_index)
+        target = df_grouped["CARRERA"].map(label_to_index)
+        value = df_grouped["count"]
 
-    x_pos = []
-    y_pos = []
-    step_y = 1.0 / (len(all_labels) + 1)
+        x_pos = []
+        y_pos = []
+        step_y = 1.0 / (len(all_labels) + 1)
 
-    for i, label in enumerate(all_labels):
-        if label == ingreso_seleccionado:
-            x_pos.append(0.01)
-            y_pos.append(0.5)
-        else:
-            x_pos.append(0.9)
-            y_pos.append(i * step_y)
-
-    import plotly.graph_objects as go
-
-    fig_sankey = go.Figure(data=[
-        go.Sankey(
-            arrangement="snap",
-            node=dict(
-                pad=20,
-                thickness=20,
-                line=dict(color="black", width=0.3),
-                label=all_labels,
-                color="rgba(255,255,255,0.9)",
-                x=x_pos,
-                y=y_pos,
-                hovertemplate='%{label}<extra></extra>'
-            ),
-            link=dict(
-                source=source,
-                target=target,
-                value=value,
-                color="rgba(255, 102, 102, 0.5)"
+        for i, label in enumerate(all_labels):
+            if label == ingreso_seleccionado:
+                x_pos.append(0.01)
+                y_pos.append(0.5)
+            else:
+                x_pos.append(0.9)
+                y_pos.append(i * step_y)
+
+        fig_sankey = go.Figure(data=[
+            go.Sankey(
+                arrangement="snap",
+                node=dict(
+                    pad=20,
+                    thickness=20,
+                    line=dict(color="black", width=0.3),
+                    label=all_labels,
+                    color="rgba(255,255,255,0.9)",
+                    x=x_pos,
+                    y=y_pos,
+                    hovertemplate='%{label}<extra></extra>'
+                ),
+                link=dict(
+                    source=source,
+                    target=target,
+                    value=value,
+                    color="rgba(255, 102, 102, 0.5)"
+                )
             )
+        ])
+
+        fig_sankey.update_layout(
+            title_text=f"Relación entre Ingreso '{ingreso_seleccionado}' y Carrera (2025)",
+            font=dict(size=13, color="black", family="Verdana"),
+            height=max(600, 30 * len(all_labels)),
+            width=1100,
+            margin=dict(l=30, r=30, t=60, b=20)
         )
-    ])
-
-    fig_sankey.update_layout(
-        title_text=f"Relación entre Ingreso '{ingreso_seleccionado}' y Carrera (2025)",
-        font=dict(size=13, color="black", family="Verdana"),
-        height=max(600, 30 * len(all_labels)),
-        width=1100,
-        margin=dict(l=30, r=30, t=60, b=20)
-    )
+        return fig_sankey
 
+    fig_sankey = grafo.nodo(
+        "fig_sankey", graficar_sankey,
+        entradas={"ingreso": ingreso_seleccionado}, depende_de=["agregados"]
+    )
     st.plotly_chart(fig_sankey, use_container_width=False, key="fig_sankey_final")
 
 
@@ -707,39 +805,89 @@ with tab5:
 # Tab 6: Carreras por Región (Top 10) + Nube de Palabras
 # ---------------------------
 with tab6:
+    # Matriz región × carrera completa: se arma una vez por versión de los datos
+    # y tanto el mapa de calor nacional como el top 10 regional son cortes de ella
+    matriz_regiones = grafo.nodo(
+        "matriz_region_carrera", lambda: matriz_region_carrera(agregados, 2025), depende_de=["agregados"]
+    )
+
+    st.header("🇨🇱 Carreras por región: vista nacional (2025)")
+
+    col_norm, col_k, col_orden = st.columns([2, 2, 1])
+    with col_norm:
+        normalizacion = st.radio(
+            "Valores",
+            ["Cantidad", "% dentro de la región", "% dentro de la carrera"],
+            horizontal=True, key="normalizacion_calor"
+        )
+    with col_k:
+        k_calor = st.slider("Carreras top por región", 1, 20, 5, key="k_calor")
+    with col_orden:
+        ordenar_calor = st.checkbox("Agrupar similares", value=True, key="ordenar_calor")
+
+    def graficar_calor():
+        eje = {"% dentro de la región": "fila", "% dentro de la carrera": "columna"}.get(normalizacion)
+        # Se normaliza la matriz completa y después se recorta: los porcentajes
+        # son sobre el total de la región o carrera, no solo de las columnas visibles
+        columnas = recortar_top_k(matriz_regiones, k_calor).columns
+        matriz = normalizar_matriz(matriz_regiones, eje)[columnas]
+        if ordenar_calor:
+            matriz = ordenar_por_clustering(matriz)
+        matriz.index = [diccionario_regiones.get(str(c).zfill(2), str(c)) for c in matriz.index]
+        fig = px.imshow(
+            matriz * 100 if eje else matriz,
+            aspect="auto",
+            color_continuous_scale="Blues",
+            labels={"x": "Carrera", "y": "Región", "color": "%" if eje else "Estudiantes"}
+        )
+        fig.update_layout(height=600, xaxis_tickangle=-45)
+        return fig
+
+    fig_calor = grafo.nodo(
+        "fig_calor",
+        graficar_calor,
+        entradas={"normalizacion": normalizacion, "k": k_calor, "ordenar": ordenar_calor},
+        depende_de=["matriz_region_carrera"]
+    )
+    st.plotly_chart(fig_calor, use_container_width=True)
+
     st.header("🎓 Carreras más frecuentes por región (2025)")
 
     codigos_region = sorted(base_total["CODIGO_REGION"].dropna().unique())
     default_index = list(codigos_region).index(8) if 8 in codigos_region else 0
     region_select = st.selectbox("Selecciona una región para explorar", codigos_region, index=default_index)
 
-    base_region = base_total[
-        (base_total["ANIO"] == 2025) &
-        (base_total["CODIGO_REGION"] == region_select)
-    ].copy()
+    # Carreras de la región con sus estudiantes: una fila de la matriz, sin recorrer la base
+    carreras_region = grafo.nodo(
+        "carreras_region",
+        lambda: top_carreras_region(matriz_regiones, int(region_select), k=None),
+        entradas={"region": region_select}, depende_de=["matriz_region_carrera"]
+    )
 
     nombre_region = diccionario_regiones.get(str(region_select).zfill(2), str(region_select))
 
-    if base_region.empty:
+    if carreras_region.empty:
         st.warning("No hay datos para esta región en el año 2025.")
     else:
-        top_carreras_region = base_region["CARRERA"].value_counts().head(10).reset_index()
-        top_carreras_region = top_carreras_region.rename(columns={
-            "index": "CARRERA",
-            "CARRERA": "N_ESTUDIANTES"
-        })
+        top_10_region = grafo.nodo(
+            "top_carreras_region", lambda: carreras_region.head(10), depende_de=["carreras_region"]
+        )
 
-        if not top_carreras_region.empty:
+        if not top_10_region.empty:
             try:
-                fig_bar_top10 = px.bar(
-                    top_carreras_region,
-                    x="N_ESTUDIANTES",
-                    y="CARRERA",
-                    orientation="h",
-                    title=f"Top 10 carreras con más estudiantes en {nombre_region} (2025)",
-                    labels={"CARRERA": "Carrera", "N_ESTUDIANTES": "Cantidad de Estudiantes"}
-                )
-                fig_bar_top10.update_layout(yaxis=dict(categoryorder='total ascending'))
+                def graficar_top10():
+                    fig_bar_top10 = px.bar(
+                        top_10_region,
+                        x="N_ESTUDIANTES",
+                        y="CARRERA",
+                        orientation="h",
+                        title=f"Top 10 carreras con más estudiantes en {nombre_region} (2025)",
+                        labels={"CARRERA": "Carrera", "N_ESTUDIANTES": "Cantidad de Estudiantes"}
+                    )
+                    fig_bar_top10.update_layout(yaxis=dict(categoryorder='total ascending'))
+                    return fig_bar_top10
+
+                fig_bar_top10 = grafo.nodo("fig_bar_top10", graficar_top10, depende_de=["top_carreras_region"])
                 st.plotly_chart(fig_bar_top10, use_container_width=True)
             except Exception as e:
                 st.error(f"No se pudo generar el gráfico de barras. Error: {e}")
@@ -748,15 +896,11 @@ with tab6:
 
         st.subheader("🔤 Nube de Palabras de Carreras (2025)")
 
-        texto_carreras = " ".join(base_region["CARRERA"].dropna().astype(str).tolist())
-        if texto_carreras.strip():
-            wordcloud = WordCloud(width=1000, height=500, background_color="white").generate(texto_carreras)
-            fig_wc, ax = plt.subplots(figsize=(15, 7))
-            ax.imshow(wordcloud, interpolation="bilinear")
-            ax.axis("off")
-            st.pyplot(fig_wc)
-        else:
-            st.info("⚠️ No hay datos suficientes para mostrar una nube de palabras en esta región.")
+        frecuencias = dict(zip(carreras_region["CARRERA"], carreras_region["N_ESTUDIANTES"].astype(int).tolist()))
+        nube_png = grafo.nodo(
+            "nube_png", lambda: generar_nube_palabras(frecuencias), depende_de=["carreras_region"]
+        )
+        st.image(nube_png, use_container_width=True)
 
 # ---------------------------
 # Tab 7: Asistente Interactivo de Datos PAES
@@ -816,5 +960,14 @@ with tab7:
     if st.button("🗑️ Borrar historial"):
         st.session_state.chat_history = []
 
+# ---------------------------
+# Depuración del grafo de dependencias (?debug=1)
+# ---------------------------
+if st.query_params.get("debug") == "1":
+    with st.sidebar.expander("🔧 Grafo de dependencias", expanded=True):
+        grafo.mostrar_depuracion()
+
+precalentar_librerias()
+
 #streamlit run app.py
 # return pd.read_excel("bbdd/base_total_homologada.xlsx")
\ No newline at end of file
@@ -0,0 +1,292 @@
+"""Caché de resultados en disco, compartida por todas las réplicas de un mismo host.
+
+`st.cache_data` vive dentro de cada proceso: con varias réplicas detrás de un
+balanceador, cada una recalcula lo mismo y todo se pierde al reiniciar. Este
+módulo guarda los resultados en un archivo SQLite (modo WAL, apto para lectores
+y escritores concurrentes) con clave = versión de los datos + nombre y
+código de la función (y de las funciones que llama) + argumentos normalizados,
+y desaloja por tamaño las entradas menos usadas.
+
+Configuración por variables de entorno:
+
+- ``DATAVIZ_CACHE_RUTA``: archivo SQLite (por defecto ``.cache_resultados/resultados.sqlite``).
+- ``DATAVIZ_CACHE_MAX_MB``: tamaño máximo de los resultados guardados (por defecto 512).
+- ``DATAVIZ_CACHE_DESACTIVADA``: si vale ``1``, se calcula siempre sin pasar por disco.
+"""
+
+import functools
+import glob
+import hashlib
+import inspect
+import os
+import pickle
+import sqlite3
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+RUTA_CACHE = os.environ.get("DATAVIZ_CACHE_RUTA", ".cache_resultados/resultados.sqlite")
+TAMANO_MAXIMO = int(float(os.environ.get("DATAVIZ_CACHE_MAX_MB", "512")) * 1024 * 1024)
+DESACTIVADA = os.environ.get("DATAVIZ_CACHE_DESACTIVADA") == "1"
+
+# Subirlo invalida todas las entradas (p. ej. si un cambio de librerías altera
+# los objetos guardados sin que cambie el código de las funciones)
+ESQUEMA_CACHE = 1
+
+# Las lecturas no escriben en disco: los accesos se acumulan en memoria y se
+# vuelcan como mucho cada INTERVALO_ACCESOS segundos (o al guardar)
+INTERVALO_ACCESOS = 60
+
+# Archivos de datos: su contenido define la versión de los datos
+RUTA_BASE = "bbdd/base_total_homologada.xlsx"
+PATRON_GEOJSON = "comunas_geojson/R*.geojson"
+ARCHIVOS_DATOS = [RUTA_BASE, PATRON_GEOJSON]
+
+_local = threading.local()
+_versiones = {}
+_accesos = {}
+_candado_accesos = threading.Lock()
+_ultimo_volcado = time.monotonic()
+
+
+# ---------------------------
+# Versión de los datos
+# ---------------------------
+
+def version_datos():
+    """Hash del contenido de los archivos de datos.
+
+    Se recalcula solo si cambia el tamaño o la fecha de modificación de algún
+    archivo, así que llamarla en cada rerun es barato.
+    """
+    rutas = sorted(ruta for patron in ARCHIVOS_DATOS for ruta in glob.glob(patron))
+    firma = tuple((ruta, os.stat(ruta).st_size, os.stat(ruta).st_mtime_ns) for ruta in rutas)
+    if firma not in _versiones:
+        h = hashlib.sha256()
+        for ruta in rutas:
+            h.update(ruta.encode())
+            with open(ruta, "rb") as f:
+                for bloque in iter(lambda: f.read(1 << 20), b""):
+                    h.update(bloque)
+        _versiones[firma] = h.hexdigest()[:16]
+    return _versiones[firma]
+
+
+# ---------------------------
+# Normalización de argumentos
+# ---------------------------
+
+def normalizar(valor):
+    # Convierte los argumentos en una estructura estable para construir la clave
+    if isinstance(valor, (pd.DataFrame, pd.Series)):
+        huella = pd.util.hash_pandas_object(valor, index=True).to_numpy()
+        columnas = tuple(map(str, valor.columns)) if isinstance(valor, pd.DataFrame) else valor.name
+        return ("pandas", type(valor).__name__, columnas, hashlib.sha256(huella.tobytes()).hexdigest())
+    if isinstance(valor, np.ndarray):
+        return ("ndarray", valor.dtype.str, valor.shape, hashlib.sha256(valor.tobytes()).hexdigest())
+    if isinstance(valor, np.generic):
+        return valor.item()
+    if isinstance(valor, dict):
+        return ("dict", tuple(sorted((repr(normalizar(k)), normalizar(v)) for k, v in valor.items())))
+    if isinstance(valor, (set, frozenset)):
+        return ("set", tuple(sorted(repr(normalizar(v)) for v in valor)))
+    if isinstance(valor, (list, tuple)):
+        return (type(valor).__name__, tuple(normalizar(v) for v in valor))
+    if valor is None or isinstance(valor, (bool, int, float, str, bytes)):
+        return valor
+    return repr(valor)
+
+
+def _nombres_globales(codigo):
+    # Nombres globales usados por la función, incluidas lambdas y funciones anidadas
+    nombres = set(codigo.co_names)
+    for constante in codigo.co_consts:
+        if inspect.iscode(constante):
+            nombres |= _nombres_globales(constante)
+    return nombres
+
+
+def _codigo_fuente(funcion, vistas, constantes):
+    # Código de la función y, recursivamente, de las funciones de Python que llama
+    # (así cargar_base se invalida si cambia limpiar_base). Las demás variables
+    # globales que lee (p. ej. ANIOS) se anotan en `constantes`.
+    funcion = inspect.unwrap(funcion)
+    if funcion in vistas:
+        return b""
+    vistas.add(funcion)
+    try:
+        codigo = inspect.getsource(funcion).encode()
+    except (OSError, TypeError):
+        codigo = funcion.__code__.co_code
+    for nombre in sorted(_nombres_globales(funcion.__code__)):
+        if nombre not in funcion.__globals__:
+            continue
+        valor = funcion.__globals__[nombre]
+        if inspect.isfunction(valor):
+            codigo += _codigo_fuente(valor, vistas, constantes)
+        elif not inspect.ismodule(valor) and not callable(valor):
+            constantes.append((f"{funcion.__module__}.{nombre}", funcion.__globals__, nombre))
+    return codigo
+
+
+@functools.lru_cache(maxsize=128)
+def _fuente_y_constantes(funcion):
+    constantes = []
+    fuente = _codigo_fuente(funcion, set(), constantes)
+    return hashlib.sha256(fuente).hexdigest()[:16], tuple(constantes)
+
+
+def version_codigo(funcion):
+    # Si cambia el código de la función o de sus auxiliares, o el valor de las
+    # constantes que leen, las entradas anteriores dejan de servir
+    fuente, constantes = _fuente_y_constantes(funcion)
+    valores = [(clave, normalizar(globales[nombre])) for clave, globales, nombre in constantes]
+    return hashlib.sha256(f"{fuente}|{valores!r}".encode()).hexdigest()[:16]
+
+
+def clave_resultado(funcion, args, kwargs):
+    nombre = f"{funcion.__module__}.{funcion.__qualname__}"
+    normalizados = (normalizar(args), normalizar(dict(kwargs)))
+    texto = f"{ESQUEMA_CACHE}|{version_datos()}|{nombre}|{version_codigo(funcion)}|{normalizados!r}"
+    return hashlib.sha256(texto.encode()).hexdigest()
+
+
+# ---------------------------
+# Almacenamiento SQLite
+# ---------------------------
+
+def _conexion():
+    # Una conexión por hilo: sqlite3 no permite compartirlas entre hilos
+    con = getattr(_local, "con", None)
+    if con is None or getattr(_local, "ruta", None) != RUTA_CACHE:
+        os.makedirs(os.path.dirname(RUTA_CACHE) or ".", exist_ok=True)
+        con = sqlite3.connect(RUTA_CACHE, timeout=30, isolation_level=None)
+        con.execute("PRAGMA journal_mode=WAL")
+        con.execute("PRAGMA synchronous=NORMAL")
+        con.execute("""
+            CREATE TABLE IF NOT EXISTS resultados (
+                clave TEXT PRIMARY KEY,
+                funcion TEXT NOT NULL,
+                version TEXT NOT NULL,
+                valor BLOB NOT NULL,
+                tamano INTEGER NOT NULL,
+                ultimo_acceso REAL NOT NULL
+            )
+        """)
+        con.execute("CREATE INDEX IF NOT EXISTS idx_ultimo_acceso ON resultados (ultimo_acceso)")
+        _local.con, _local.ruta = con, RUTA_CACHE
+    return con
+
+
+def leer(clave):
+    """Devuelve ``(True, valor)`` si la clave está guardada, ``(False, None)`` si no."""
+    con = _conexion()
+    fila = con.execute("SELECT valor FROM resultados WHERE clave = ?", (clave,)).fetchone()
+    if fila is None:
+        return False, None
+    _registrar_acceso(clave)
+    return True, pickle.loads(fila[0])
+
+
+def _tomar_accesos():
+    global _ultimo_volcado
+    with _candado_accesos:
+        pendientes = [(momento, clave) for clave, momento in _accesos.items()]
+        _accesos.clear()
+        _ultimo_volcado = time.monotonic()
+    return pendientes
+
+
+def _registrar_acceso(clave):
+    with _candado_accesos:
+        _accesos[clave] = time.time()
+        if time.monotonic() - _ultimo_volcado < INTERVALO_ACCESOS:
+            return
+    pendientes = _tomar_accesos()
+    con = _conexion()
+    try:
+        con.execute("BEGIN IMMEDIATE")
+        con.executemany("UPDATE resultados SET ultimo_acceso = ? WHERE clave = ?", pendientes)
+        con.execute("COMMIT")
+    except sqlite3.Error:
+        # Solo afecta el orden de desalojo: se descartan si la base está ocupada
+        if con.in_transaction:
+            con.execute("ROLLBACK")
+
+
+def guardar(clave, funcion, valor):
+    datos = pickle.dumps(valor, protocol=pickle.HIGHEST_PROTOCOL)
+    if len(datos) > TAMANO_MAXIMO:
+        return
+    con = _conexion()
+    con.execute("BEGIN IMMEDIATE")
+    try:
+        con.execute(
+            "INSERT OR REPLACE INTO resultados VALUES (?, ?, ?, ?, ?, ?)",
+            (clave, funcion, version_datos(), datos, len(datos), time.time())
+        )
+        # Ya se tiene el bloqueo de escritura: se aprovecha para volcar los accesos
+        con.executemany("UPDATE resultados SET ultimo_acceso = ? WHERE clave = ?", _tomar_accesos())
+        _desalojar(con)
+        con.execute("COMMIT")
+    except BaseException:
+        con.execute("ROLLBACK")
+        raise
+
+
+def _desalojar(con):
+    # Borra las entradas usadas hace más tiempo hasta quedar bajo el 90% del máximo
+    total = con.execute("SELECT COALESCE(SUM(tamano), 0) FROM resultados").fetchone()[0]
+    if total <= TAMANO_MAXIMO:
+        return
+    objetivo = total - int(TAMANO_MAXIMO * 0.9)
+    liberado = 0
+    claves = []
+    for clave, tamano in con.execute("SELECT clave, tamano FROM resultados ORDER BY ultimo_acceso"):
+        claves.append((clave,))
+        liberado += tamano
+        if liberado >= objetivo:
+            break
+    con.executemany("DELETE FROM resultados WHERE clave = ?", claves)
+
+
+def limpiar():
+    """Elimina todas las entradas guardadas."""
+    _tomar_accesos()
+    _conexion().execute("DELETE FROM resultados")
+
+
+# ---------------------------
+# Decorador
+# ---------------------------
+
+def cache_persistente(funcion):
+    """Guarda en disco el resultado de `funcion` para cada versión de datos y argumentos.
+
+    Se combina con ``@st.cache_data`` (encima) para mantener además la copia
+    en memoria del proceso. Cualquier error de la caché se ignora y la función
+    se calcula normalmente.
+    """
+    nombre = f"{funcion.__module__}.{funcion.__qualname__}"
+
+    @functools.wraps(funcion)
+    def envoltura(*args, **kwargs):
+        if DESACTIVADA:
+            return funcion(*args, **kwargs)
+        try:
+            clave = clave_resultado(funcion, args, kwargs)
+            encontrado, valor = leer(clave)
+            if encontrado:
+                return valor
+        except Exception:
+            return funcion(*args, **kwargs)
+        valor = funcion(*args, **kwargs)
+        try:
+            guardar(clave, nombre, valor)
+        except Exception:
+            pass
+        return valor
+
+    return envoltura
@@ -0,0 +1,123 @@
+"""Grafo de dependencias para las tablas y figuras derivadas del dashboard.
+
+Streamlit vuelve a ejecutar app.py completo con cada cambio de un widget. Cada
+tabla o figura derivada se declara como un nodo con sus entradas (valores de
+widgets, versión de los datos) y los nodos de los que depende. La huella del
+nodo combina ambas cosas y, si ya existe un valor calculado con esa misma
+huella, se reutiliza en vez de recalcularlo.
+
+Los valores se guardan en un almacén del proceso compartido entre sesiones:
+dos usuarios con los mismos filtros reutilizan el mismo resultado. Por eso
+los valores que devuelve un nodo no deben modificarse en el lugar.
+"""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+import pandas as pd
+import streamlit as st
+
+from cache_resultados import normalizar
+
+# Valores guardados por nodo (una huella distinta por combinación de filtros)
+VALORES_POR_NODO = 32
+
+
+class AlmacenNodos:
+    def __init__(self, maximo=VALORES_POR_NODO):
+        self.maximo = maximo
+        self._valores = {}
+        self._candado = threading.Lock()
+
+    def obtener(self, nombre, huella):
+        with self._candado:
+            valores = self._valores.get(nombre)
+            if valores is None or huella not in valores:
+                return False, None
+            valores.move_to_end(huella)
+            return True, valores[huella]
+
+    def guardar(self, nombre, huella, valor):
+        with self._candado:
+            valores = self._valores.setdefault(nombre, OrderedDict())
+            valores[huella] = valor
+            valores.move_to_end(huella)
+            while len(valores) > self.maximo:
+                valores.popitem(last=False)
+
+
+@st.cache_resource
+def almacen_nodos():
+    return AlmacenNodos()
+
+
+class GrafoReactivo:
+    """Grafo de una ejecución de app.py.
+
+    `previas` es un diccionario que sobrevive entre reruns de la misma sesión
+    (p. ej. una entrada de ``st.session_state``) y solo se usa para explicar
+    en la vista de depuración qué entrada cambió.
+    """
+
+    def __init__(self, almacen, previas):
+        self.almacen = almacen
+        self.previas = previas
+        self.huellas = {}
+        self.dependencias = {}
+        self.decisiones = []
+
+    def nodo(self, nombre, funcion, entradas=None, depende_de=()):
+        entradas = {clave: normalizar(valor) for clave, valor in (entradas or {}).items()}
+        padres = {padre: self.huellas[padre] for padre in depende_de}
+        texto = repr((nombre, sorted(entradas.items()), sorted(padres.items())))
+        huella = hashlib.sha256(texto.encode()).hexdigest()[:16]
+
+        inicio = time.perf_counter()
+        encontrado, valor = self.almacen.obtener(nombre, huella)
+        if not encontrado:
+            valor = funcion()
+            self.almacen.guardar(nombre, huella, valor)
+        duracion = time.perf_counter() - inicio
+
+        self.decisiones.append({
+            "NODO": nombre,
+            "DECISION": "reutilizado" if encontrado else "recalculado",
+            "MOTIVO": self._motivo(nombre, entradas, padres, encontrado),
+            "MS": round(duracion * 1000, 1),
+        })
+        self.huellas[nombre] = huella
+        self.dependencias[nombre] = (list(entradas), list(depende_de))
+        self.previas[nombre] = (entradas, padres)
+        return valor
+
+    def _motivo(self, nombre, entradas, padres, encontrado):
+        if nombre not in self.previas:
+            return "caché compartida" if encontrado else "primera ejecución"
+        entradas_previas, padres_previos = self.previas[nombre]
+        cambios = [clave for clave in entradas if entradas_previas.get(clave) != entradas[clave]]
+        cambios += [padre for padre in padres if padres_previos.get(padre) != padres[padre]]
+        if not cambios:
+            return "sin cambios"
+        motivo = "cambió " + ", ".join(cambios)
+        return motivo + " (caché compartida)" if encontrado else motivo
+
+    def mostrar_depuracion(self):
+        """Tabla de decisiones y diagrama del grafo de esta ejecución."""
+        colores = {"reutilizado": "#B7E1A1", "recalculado": "#F9C784"}
+        decision = {d["NODO"]: d["DECISION"] for d in self.decisiones}
+        lineas = ["digraph {", "rankdir=LR;", "node [shape=box, style=filled, fontsize=10];"]
+        for nombre, (entradas, padres) in self.dependencias.items():
+            lineas.append(f'"{nombre}" [fillcolor="{colores[decision[nombre]]}"];')
+            for entrada in entradas:
+                lineas.append(f'"{nombre}:{entrada}" [label="{entrada}", shape=ellipse, fillcolor="#FFFFFF"];')
+                lineas.append(f'"{nombre}:{entrada}" -> "{nombre}";')
+            for padre in padres:
+                lineas.append(f'"{padre}" -> "{nombre}";')
+        lineas.append("}")
+
+        recalculados = sum(1 for d in self.decisiones if d["DECISION"] == "recalculado")
+        st.caption(f"{recalculados} de {len(self.decisiones)} nodos recalculados en esta ejecución.")
+        st.dataframe(pd.DataFrame(self.decisiones), hide_index=True)
+        st.graphviz_chart("\n".join(lineas))
@@ -0,0 +1,139 @@
+"""Perfil de arranque del dashboard y presupuesto de tiempo para CI.
+
+Mide, en procesos nuevos de Python, cuánto tarda la primera ejecución completa
+de app.py (lo que espera el usuario antes del primer render) en dos escenarios:
+
+- ``sin_cache``: caché en disco vacía, como un despliegue en una máquina nueva.
+- ``con_cache``: caché en disco ya poblada, como al reiniciar una réplica.
+
+En cada escenario registra las librerías que se importan durante la ejecución
+y las importaciones más lentas (``python -X importtime``). El perfil se guarda
+en ``perfil_arranque.json``. El script termina con código 1 si algún escenario
+tarda más que su tiempo de referencia en ``presupuesto_arranque.json``
+multiplicado por la tolerancia, o si, con la caché poblada, se importa alguna
+librería marcada como prohibida. Al cambiar el arranque a propósito, se
+actualiza la referencia con los tiempos del nuevo perfil.
+
+Uso:
+    python perfil_arranque.py
+    python perfil_arranque.py --salida perfil.json --presupuesto presupuesto_arranque.json
+"""
+
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+DIRECTORIO_APP = os.path.dirname(os.path.abspath(__file__))
+
+
+def medir():
+    # Se ejecuta en el proceso hijo: una sola ejecución de app.py con AppTest
+    from streamlit.testing.v1 import AppTest
+
+    antes = set(sys.modules)
+    prueba = AppTest.from_file(os.path.join(DIRECTORIO_APP, "app.py"), default_timeout=600)
+    inicio = time.perf_counter()
+    prueba.run()
+    duracion = time.perf_counter() - inicio
+
+    nuevos = sorted({modulo.split(".")[0] for modulo in set(sys.modules) - antes})
+    print(json.dumps({
+        "segundos": round(duracion, 2),
+        "librerias_importadas": nuevos,
+        "modulos_previos": sorted(antes),
+        "errores": [e.message for e in prueba.exception],
+    }))
+
+
+def importaciones_lentas(salida_importtime, librerias, previos, cantidad=10):
+    # Líneas de -X importtime: "import time: propio | acumulado | módulo"
+    tiempos = []
+    for linea in salida_importtime.splitlines():
+        if not linea.startswith("import time:") or "|" not in linea:
+            continue
+        _, acumulado, modulo = linea[len("import time:"):].split("|")
+        if modulo.startswith("  ") or not acumulado.strip().isdigit():
+            continue
+        modulo = modulo.strip()
+        if modulo.split(".")[0] in librerias and modulo not in previos:
+            tiempos.append({"modulo": modulo, "ms": round(int(acumulado) / 1000, 1)})
+    return sorted(tiempos, key=lambda t: t["ms"], reverse=True)[:cantidad]
+
+
+def escenario(ruta_cache):
+    entorno = dict(os.environ, DATAVIZ_CACHE_RUTA=ruta_cache, DATAVIZ_PRECALENTAR="0")
+    entorno.pop("DATAVIZ_CACHE_DESACTIVADA", None)
+    inicio = time.perf_counter()
+    proceso = subprocess.run(
+        [sys.executable, "-X", "importtime", os.path.abspath(__file__), "--medir"],
+        cwd=DIRECTORIO_APP, env=entorno, capture_output=True, text=True
+    )
+    total = time.perf_counter() - inicio
+    if proceso.returncode != 0:
+        raise RuntimeError(f"La medición falló:\n{proceso.stderr[-2000:]}")
+
+    resultado = json.loads(proceso.stdout.strip().splitlines()[-1])
+    resultado["segundos_proceso"] = round(total, 2)
+    previos = set(resultado.pop("modulos_previos"))
+    resultado["importaciones_lentas"] = importaciones_lentas(
+        proceso.stderr, resultado["librerias_importadas"], previos
+    )
+    return resultado
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Perfil de arranque y presupuesto de tiempo.")
+    parser.add_argument("--medir", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--salida", default="perfil_arranque.json")
+    parser.add_argument("--presupuesto", default=os.path.join(DIRECTORIO_APP, "presupuesto_arranque.json"))
+    args = parser.parse_args()
+
+    if args.medir:
+        medir()
+        return
+
+    with open(args.presupuesto, encoding="utf-8") as f:
+        presupuesto = json.load(f)
+
+    directorio_cache = tempfile.mkdtemp(prefix="dataviz_cache_")
+    try:
+        ruta_cache = os.path.join(directorio_cache, "resultados.sqlite")
+        perfil = {
+            "sin_cache": escenario(ruta_cache),
+            "con_cache": escenario(ruta_cache),
+        }
+    finally:
+        shutil.rmtree(directorio_cache, ignore_errors=True)
+
+    with open(args.salida, "w", encoding="utf-8") as f:
+        json.dump(perfil, f, ensure_ascii=False, indent=2)
+
+    fallas = []
+    for nombre, resultado in perfil.items():
+        referencia = presupuesto["referencia"][f"{nombre}_s"]
+        limite = round(referencia * presupuesto["tolerancia"], 2)
+        print(f"{nombre}: {resultado['segundos']:.2f} s (referencia {referencia} s, presupuesto {limite} s)")
+        for importacion in resultado["importaciones_lentas"][:5]:
+            print(f"    {importacion['ms']:>8.1f} ms  {importacion['modulo']}")
+        if resultado["errores"]:
+            fallas.append(f"{nombre}: la app lanzó excepciones: {resultado['errores']}")
+        if resultado["segundos"] > limite:
+            fallas.append(f"{nombre}: {resultado['segundos']:.2f} s supera el presupuesto de {limite} s")
+
+    prohibidas = set(presupuesto.get("prohibidas_con_cache", []))
+    importadas = prohibidas & set(perfil["con_cache"]["librerias_importadas"])
+    if importadas:
+        fallas.append(f"con_cache: se importaron librerías pesadas antes del primer render: {sorted(importadas)}")
+
+    for falla in fallas:
+        print(f"ERROR {falla}", file=sys.stderr)
+    sys.exit(1 if fallas else 0)
+
+
+if __name__ == "__main__":
+    main()
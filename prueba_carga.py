@@ -0,0 +1,328 @@
+"""Prueba de carga del dashboard: N sesiones concurrentes contra app.py levantada localmente.
+
+Cada sesión abre el websocket de Streamlit igual que un navegador y sigue un
+recorrido típico: abre la app, cambia las carreras de la pestaña 1, mira el
+mapa, cambia de región en la pestaña 6 y le hace preguntas al ChatBot. Para
+cada cantidad de sesiones se lanza un proceso nuevo de la app y se reportan
+la latencia de los reruns (p50/p95/p99), el throughput y la memoria.
+
+Cambiar de pestaña (p. ej. abrir el mapa) ocurre solo en el navegador y no
+provoca rerun; en el recorrido aparece como tiempo de lectura del usuario.
+
+Uso:
+    python prueba_carga.py --sesiones 1 5 10 20 --recorridos 2
+    python prueba_carga.py --sesiones 10 --max-p95 3000 --json carga.json
+
+Con ``--max-p95`` el script termina con código 1 si alguna etapa lo supera,
+para usarlo en CI.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+
+import numpy as np
+import websockets
+from streamlit.proto.BackMsg_pb2 import BackMsg
+from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+from streamlit.proto.MultiSelect_pb2 import MultiSelect
+from streamlit.proto.Selectbox_pb2 import Selectbox
+from streamlit.proto.WidgetStates_pb2 import WidgetState
+
+DIRECTORIO_APP = os.path.dirname(os.path.abspath(__file__))
+
+# Widgets que usa el recorrido: nombre -> (tipo de elemento, key o etiqueta)
+WIDGETS = {
+    "carreras": ("multiselect", "filtro_carrera_tab1"),
+    "region": ("selectbox", "Selecciona una región para explorar"),
+    "pregunta": ("text_input", "chat_input_bot"),
+}
+
+PREGUNTAS = [
+    "¿Hay diferencia por sexo en los puntajes?",
+    "¿En qué carrera hay más mujeres que hombres?",
+    "¿En qué carrera hay más hombres?",
+    "¿Cuál es la carrera con mayor puntaje?",
+]
+
+# Streamlit reciente envía las opciones como texto; versiones antiguas, como índices
+_OPCIONES_COMO_TEXTO = "raw_values" in MultiSelect.DESCRIPTOR.fields_by_name
+_OPCION_COMO_TEXTO = "raw_value" in Selectbox.DESCRIPTOR.fields_by_name
+
+
+# ---------------------------
+# Sesión simulada
+# ---------------------------
+
+class Sesion:
+    def __init__(self, url):
+        self.url = url
+        self.ws = None
+        self.widgets = {}   # nombre -> (id, opciones)
+        self.estados = {}   # id -> WidgetState enviado en cada rerun
+        self.mediciones = []  # (accion, segundos, ok)
+
+    async def conectar(self):
+        self.ws = await websockets.connect(self.url, subprotocols=["streamlit"], max_size=None)
+
+    async def cerrar(self):
+        if self.ws is not None:
+            await self.ws.close()
+
+    async def rerun(self, accion):
+        mensaje = BackMsg()
+        mensaje.rerun_script.query_string = ""
+        mensaje.rerun_script.page_script_hash = ""
+        mensaje.rerun_script.widget_states.widgets.extend(self.estados.values())
+
+        inicio = time.perf_counter()
+        await self.ws.send(mensaje.SerializeToString())
+        ok = True
+        while True:
+            respuesta = ForwardMsg()
+            respuesta.ParseFromString(await self.ws.recv())
+            tipo = respuesta.WhichOneof("type")
+            if tipo == "delta" and respuesta.delta.WhichOneof("type") == "new_element":
+                ok &= self._registrar_elemento(respuesta.delta.new_element)
+            elif tipo == "script_finished":
+                ok &= respuesta.script_finished == ForwardMsg.FINISHED_SUCCESSFULLY
+                break
+        self.mediciones.append((accion, time.perf_counter() - inicio, ok))
+
+    def _registrar_elemento(self, elemento):
+        tipo = elemento.WhichOneof("type")
+        if tipo == "exception":
+            return False
+        for nombre, (tipo_widget, marca) in WIDGETS.items():
+            if tipo != tipo_widget:
+                continue
+            widget = getattr(elemento, tipo)
+            if widget.id.endswith(f"-{marca}") or widget.label == marca:
+                opciones = list(getattr(widget, "options", []))
+                self.widgets[nombre] = (widget.id, opciones)
+        return True
+
+    def fijar(self, nombre, valor):
+        id_widget, opciones = self.widgets[nombre]
+        estado = WidgetState(id=id_widget)
+        if nombre == "carreras":
+            if _OPCIONES_COMO_TEXTO:
+                estado.string_array_value.data.extend(valor)
+            else:
+                estado.int_array_value.data.extend(opciones.index(v) for v in valor)
+        elif nombre == "region":
+            if _OPCION_COMO_TEXTO:
+                estado.string_value = valor
+            else:
+                estado.int_value = opciones.index(valor)
+        else:
+            estado.string_value = valor
+        self.estados[id_widget] = estado
+
+
+async def recorrido(sesion, rng, pausa):
+    async def leer():
+        await asyncio.sleep(rng.uniform(0, 2 * pausa))
+
+    # Pestaña 1: elegir entre una y cuatro carreras
+    _, carreras = sesion.widgets["carreras"]
+    sesion.fijar("carreras", rng.sample(carreras, k=rng.randint(1, min(4, len(carreras)))))
+    await sesion.rerun("carreras")
+    await leer()
+
+    # Pestaña 2: mirar el mapa (sin rerun)
+    await leer()
+
+    # Pestaña 6: recorrer algunas regiones
+    _, regiones = sesion.widgets["region"]
+    for region in rng.sample(regiones, k=rng.randint(1, min(3, len(regiones)))):
+        sesion.fijar("region", region)
+        await sesion.rerun("region")
+        await leer()
+
+    # Pestaña 7: preguntas al ChatBot
+    for pregunta in rng.sample(PREGUNTAS, k=2):
+        sesion.fijar("pregunta", pregunta)
+        await sesion.rerun("chatbot")
+        await leer()
+
+
+async def simular_sesion(url, semilla, recorridos, pausa):
+    rng = random.Random(semilla)
+    sesion = Sesion(url)
+    try:
+        await sesion.conectar()
+        await sesion.rerun("inicio")
+        for _ in range(recorridos):
+            await recorrido(sesion, rng, pausa)
+    except Exception as e:
+        sesion.mediciones.append(("error", 0.0, False))
+        print(f"  sesión {semilla}: {type(e).__name__}: {e}", file=sys.stderr)
+    finally:
+        await sesion.cerrar()
+    return sesion.mediciones
+
+
+# ---------------------------
+# Servidor y memoria
+# ---------------------------
+
+def puerto_libre():
+    with socket.socket() as s:
+        s.bind(("localhost", 0))
+        return s.getsockname()[1]
+
+
+def lanzar_app(puerto, espera=120):
+    # Sin precalentar librerías: esas importaciones en segundo plano seguirían
+    # corriendo al medir la memoria base y los reruns, y se contarían por sesión
+    entorno = dict(os.environ, DATAVIZ_PRECALENTAR="0")
+    proceso = subprocess.Popen(
+        [
+            sys.executable, "-m", "streamlit", "run", "app.py",
+            f"--server.port={puerto}",
+            "--server.headless=true",
+            "--server.fileWatcherType=none",
+            "--browser.gatherUsageStats=false",
+        ],
+        cwd=DIRECTORIO_APP,
+        env=entorno,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    limite = time.time() + espera
+    while time.time() < limite:
+        if proceso.poll() is not None:
+            raise RuntimeError("La app terminó antes de quedar disponible.")
+        try:
+            with urllib.request.urlopen(f"http://localhost:{puerto}/_stcore/health", timeout=1) as r:
+                if r.status == 200:
+                    return proceso
+        except OSError:
+            time.sleep(0.5)
+    proceso.terminate()
+    raise RuntimeError(f"La app no respondió en {espera} s.")
+
+
+def memoria_mb(pid):
+    # RSS del proceso según /proc (solo Linux); None si no está disponible
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for linea in f:
+                if linea.startswith("VmRSS:"):
+                    return int(linea.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+async def muestrear_memoria(pid, pico, intervalo=0.2):
+    while True:
+        mb = memoria_mb(pid)
+        if mb is not None:
+            pico[0] = max(pico[0], mb)
+        await asyncio.sleep(intervalo)
+
+
+# ---------------------------
+# Etapas y reporte
+# ---------------------------
+
+def resumir(latencias):
+    if not latencias:
+        return {"p50_ms": None, "p95_ms": None, "p99_ms": None}
+    p50, p95, p99 = np.percentile(np.array(latencias) * 1000, [50, 95, 99])
+    return {"p50_ms": round(p50, 1), "p95_ms": round(p95, 1), "p99_ms": round(p99, 1)}
+
+
+async def etapa(n_sesiones, args):
+    puerto = puerto_libre()
+    proceso = lanzar_app(puerto)
+    url = f"ws://localhost:{puerto}/_stcore/stream"
+    try:
+        # Una sesión de calentamiento llena las cachés antes de medir
+        await simular_sesion(url, -1, 0, 0)
+        base_mb = memoria_mb(proceso.pid)
+        pico = [base_mb or 0.0]
+        muestreo = asyncio.create_task(muestrear_memoria(proceso.pid, pico))
+
+        inicio = time.perf_counter()
+        resultados = await asyncio.gather(*[
+            simular_sesion(url, args.semilla + i, args.recorridos, args.pausa)
+            for i in range(n_sesiones)
+        ])
+        duracion = time.perf_counter() - inicio
+        muestreo.cancel()
+    finally:
+        proceso.terminate()
+        proceso.wait()
+
+    mediciones = [m for r in resultados for m in r]
+    latencias = [s for accion, s, ok in mediciones if accion != "error"]
+    por_accion = {}
+    for accion, s, _ in mediciones:
+        if accion != "error":
+            por_accion.setdefault(accion, []).append(s)
+
+    return {
+        "sesiones": n_sesiones,
+        "reruns": len(latencias),
+        "errores": sum(1 for _, _, ok in mediciones if not ok),
+        **resumir(latencias),
+        "reruns_por_s": round(len(latencias) / duracion, 2),
+        "memoria_base_mb": round(base_mb, 1) if base_mb is not None else None,
+        "memoria_pico_mb": round(pico[0], 1) if base_mb is not None else None,
+        "mb_por_sesion": round((pico[0] - base_mb) / n_sesiones, 2) if base_mb is not None else None,
+        "por_accion": {accion: resumir(valores) for accion, valores in por_accion.items()},
+    }
+
+
+def imprimir(resultados):
+    columnas = ["sesiones", "reruns", "errores", "p50_ms", "p95_ms", "p99_ms",
+                "reruns_por_s", "memoria_pico_mb", "mb_por_sesion"]
+    print("  ".join(f"{c:>15}" for c in columnas))
+    for r in resultados:
+        print("  ".join(f"{str(r[c]):>15}" for c in columnas))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prueba de carga con sesiones concurrentes.")
+    parser.add_argument("--sesiones", type=int, nargs="+", default=[1, 5, 10],
+                        help="cantidades de sesiones concurrentes a probar")
+    parser.add_argument("--recorridos", type=int, default=2,
+                        help="recorridos completos por sesión")
+    parser.add_argument("--pausa", type=float, default=1.0,
+                        help="tiempo medio de lectura entre clics, en segundos")
+    parser.add_argument("--semilla", type=int, default=0)
+    parser.add_argument("--json", help="archivo donde guardar los resultados")
+    parser.add_argument("--max-p95", type=float,
+                        help="falla si el p95 de alguna etapa supera este valor (ms)")
+    args = parser.parse_args()
+
+    resultados = []
+    for n in args.sesiones:
+        print(f"Probando {n} sesiones concurrentes...", file=sys.stderr)
+        resultados.append(asyncio.run(etapa(n, args)))
+
+    imprimir(resultados)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(resultados, f, ensure_ascii=False, indent=2)
+
+    fallas = [r for r in resultados if r["errores"]]
+    if args.max_p95 is not None:
+        fallas += [r for r in resultados if r["p95_ms"] is not None and r["p95_ms"] > args.max_p95]
+    if fallas:
+        print("La prueba de carga no cumple los límites.", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()